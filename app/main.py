@@ -1,16 +1,26 @@
-from fastapi import FastAPI, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import FastAPI
+from fastapi.responses import FileResponse, StreamingResponse
+import pandas as pd
+import pyarrow.parquet as pq
 import uuid
 from app.services.report_service import ReportService
 from app.models.models import ReportStatus
 from app.database import get_db
+from app.worker import generate_report
 from sqlalchemy.orm import Session
 from fastapi import Depends
 
 app = FastAPI(title="Store Monitoring System")
 
+def _parquet_to_csv(file_path: str):
+    """Yield a Parquet report as CSV, one row batch at a time"""
+    parquet_file = pq.ParquetFile(file_path)
+    yield pd.DataFrame(columns=parquet_file.schema_arrow.names).to_csv(index=False)
+    for batch in parquet_file.iter_batches():
+        yield batch.to_pandas().to_csv(index=False, header=False)
+
 @app.post("/trigger_report")
-async def trigger_report(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def trigger_report(db: Session = Depends(get_db)):
     """
     Trigger a new report generation
     """
@@ -20,13 +30,13 @@ async def trigger_report(background_tasks: BackgroundTasks, db: Session = Depend
     # Create initial report record
     report_service.create_report(report_id)
     
-    # Trigger background task
-    background_tasks.add_task(report_service.generate_report, report_id)
+    # Hand the report off to the worker queue
+    generate_report.send(report_id)
     
     return {"report_id": report_id}
 
 @app.get("/get_report/{report_id}")
-async def get_report(report_id: str, db: Session = Depends(get_db)):
+def get_report(report_id: str, db: Session = Depends(get_db)):
     """
     Get report status or download completed report
     """
@@ -40,10 +50,18 @@ async def get_report(report_id: str, db: Session = Depends(get_db)):
         return {"status": "Running"}
     
     if report.status == ReportStatus.COMPLETED:
+        filename = f"report_{report_id}.csv"
+        if report.file_path.endswith(".parquet"):
+            # Reports are stored as Parquet and converted to CSV on download
+            return StreamingResponse(
+                _parquet_to_csv(report.file_path),
+                media_type="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
         return FileResponse(
             report.file_path,
             media_type="text/csv",
-            filename=f"report_{report_id}.csv"
+            filename=filename
         )
     
     return {"status": "Failed"} 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Time, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 import enum
@@ -20,21 +20,24 @@ class Store(Base):
 
 class BusinessHours(Base):
     __tablename__ = "business_hours"
+    __table_args__ = (Index("ix_bh_store_day", "store_id", "day_of_week"),)
 
     id = Column(Integer, primary_key=True)
     store_id = Column(String, ForeignKey("stores.store_id"))
     day_of_week = Column(Integer)  # 0=Monday, 6=Sunday
-    start_time_local = Column(String)
-    end_time_local = Column(String)
+    start_time_local = Column(Time)
+    end_time_local = Column(Time)
     
     store = relationship("Store", back_populates="business_hours")
 
 class StoreStatus(Base):
     __tablename__ = "store_status"
+    # Report queries filter on a store and a timestamp range
+    __table_args__ = (Index("ix_status_store_ts", "store_id", "timestamp_utc"),)
 
     id = Column(Integer, primary_key=True)
     store_id = Column(String, ForeignKey("stores.store_id"))
-    timestamp_utc = Column(DateTime)
+    timestamp_utc = Column(DateTime(timezone=True))
     status = Column(String)  # active or inactive
     
     store = relationship("Store", back_populates="status_updates")
@@ -0,0 +1,52 @@
+"""
+Bring an existing database in line with the models.
+
+Base.metadata.create_all only creates missing tables, so schema changes made
+after a database was initialized are applied here. Run with:
+
+    python -m app.scripts.migrate
+"""
+from sqlalchemy import text
+from app.database import engine
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Column type changes as (table, column, target type, USING expression). Existing
+# naive store_status timestamps hold UTC.
+COLUMN_TYPES = [
+    ("business_hours", "start_time_local", "time without time zone", "start_time_local::time"),
+    ("business_hours", "end_time_local", "time without time zone", "end_time_local::time"),
+    ("store_status", "timestamp_utc", "timestamp with time zone", "timestamp_utc AT TIME ZONE 'UTC'"),
+]
+
+MIGRATIONS = [
+    # Composite indexes for the report queries, built without blocking writes
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_status_store_ts ON store_status (store_id, timestamp_utc)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bh_store_day ON business_hours (store_id, day_of_week)",
+]
+
+def _alter_column_types(conn):
+    for table, column, target_type, using in COLUMN_TYPES:
+        current_type = conn.execute(
+            text("SELECT data_type FROM information_schema.columns WHERE table_name = :table AND column_name = :column"),
+            {"table": table, "column": column},
+        ).scalar()
+        if current_type is None or current_type == target_type:
+            continue
+        statement = f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {target_type} USING {using}"
+        logger.info(f"Running: {statement}")
+        conn.execute(text(statement))
+
+def migrate():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        _alter_column_types(conn)
+        for statement in MIGRATIONS:
+            logger.info(f"Running: {statement}")
+            conn.execute(text(statement))
+    logger.info("Migrations complete")
+
+if __name__ == "__main__":
+    migrate()
@@ -1,15 +1,304 @@
+from app.database import create_async_db_engine
 from app.models.models import Report, ReportStatus, Store, BusinessHours, StoreStatus
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+import multiprocessing
+from numba import njit
+import numpy as np
 import pandas as pd
-import pytz
 import os
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_TIMEZONE = "America/Chicago"
+
+# Status updates are streamed from the db in chunks of this many rows
+STATUS_CHUNK_SIZE = 10000
+STATUS_COLUMNS = ["store_id", "timestamp_utc", "status"]
+# Concurrent per-batch status queries when loading over asyncpg
+ASYNC_QUERY_CONCURRENCY = 20
+
+MINUTES_PER_DAY = 24 * 60
+
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+
+# The whole report in one pass over the week of status updates, streamed with the DBAPI cursor's
+# copy_expert. Each status holds until the next update (LEAD()), the last one until :end_time, and
+# counts in every window it starts in. Each window also starts with the last status seen before
+# it, or the first one in it if there is none, up to its first update. Stores without business
+# hours are open 24/7, and empty or unknown timezones fall back to the default. Durations are
+# summed as exact numeric seconds and ROUND rounds halves up, as _build_results does.
+# COPY takes no bind parameters, so the values are rendered with mogrify.
+REPORT_COPY_SQL = """
+    COPY (
+        WITH windows (period, start_time) AS (
+            VALUES
+                ('hour', %(last_hour)s::timestamptz),
+                ('day', %(last_day)s::timestamptz),
+                ('week', %(last_week)s::timestamptz)
+        ),
+        store_timezones AS (
+            SELECT st.store_id, COALESCE(tz.name, %(default_timezone)s) AS timezone
+            FROM stores st
+            LEFT JOIN pg_timezone_names tz ON tz.name = st.timezone
+        ),
+        updates AS (
+            SELECT
+                s.store_id,
+                s.status,
+                s.timestamp_utc,
+                LAG(s.timestamp_utc) OVER w AS previous_utc,
+                COALESCE(LEAD(s.timestamp_utc) OVER w, %(end_time)s::timestamptz) AS next_utc,
+                st.timezone
+            FROM store_status s
+            JOIN store_timezones st ON st.store_id = s.store_id
+            WHERE s.timestamp_utc BETWEEN %(last_week)s AND %(end_time)s
+            WINDOW w AS (PARTITION BY s.store_id ORDER BY s.timestamp_utc)
+        ),
+        intervals AS (
+            SELECT u.store_id, NULL AS period, u.status, u.timestamp_utc AS start_utc, u.next_utc AS end_utc, u.timezone
+            FROM updates u
+            UNION ALL
+            SELECT
+                u.store_id,
+                w.period,
+                u.status,
+                w.start_time,
+                CASE WHEN u.timestamp_utc < w.start_time THEN u.next_utc ELSE u.timestamp_utc END,
+                u.timezone
+            FROM updates u
+            JOIN windows w
+              ON (u.timestamp_utc < w.start_time AND u.next_utc >= w.start_time)
+              OR (u.timestamp_utc >= w.start_time AND u.previous_utc IS NULL)
+        ),
+        hours AS (
+            -- The first entry for a day wins
+            SELECT DISTINCT ON (store_id, day_of_week) store_id, day_of_week, start_time_local, end_time_local
+            FROM business_hours
+            ORDER BY store_id, day_of_week, id
+        ),
+        scheduled AS (
+            SELECT DISTINCT store_id FROM business_hours
+        ),
+        open_intervals AS (
+            SELECT
+                i.store_id,
+                i.status = 'active' AS active,
+                COALESCE(i.period = 'hour', i.start_utc >= %(last_hour)s) AS in_hour,
+                COALESCE(i.period = 'day', i.start_utc >= %(last_day)s) AS in_day,
+                COALESCE(i.period = 'week', TRUE) AS in_week,
+                EXTRACT(EPOCH FROM i.end_utc - i.start_utc)::numeric AS seconds
+            FROM intervals i
+            LEFT JOIN scheduled sc ON sc.store_id = i.store_id
+            LEFT JOIN hours h ON h.store_id = i.store_id
+                AND h.day_of_week = EXTRACT(ISODOW FROM i.start_utc AT TIME ZONE i.timezone) - 1
+            WHERE sc.store_id IS NULL
+               OR date_trunc('minute', i.start_utc AT TIME ZONE i.timezone)::time
+                  BETWEEN h.start_time_local AND h.end_time_local
+        ),
+        totals AS (
+            SELECT
+                store_id,
+                SUM(seconds) FILTER (WHERE active AND in_hour) AS uptime_hour,
+                SUM(seconds) FILTER (WHERE active AND in_day) AS uptime_day,
+                SUM(seconds) FILTER (WHERE active AND in_week) AS uptime_week,
+                SUM(seconds) FILTER (WHERE NOT active AND in_hour) AS downtime_hour,
+                SUM(seconds) FILTER (WHERE NOT active AND in_day) AS downtime_day,
+                SUM(seconds) FILTER (WHERE NOT active AND in_week) AS downtime_week
+            FROM open_intervals
+            GROUP BY store_id
+        )
+        SELECT
+            st.store_id,
+            ROUND(COALESCE(t.uptime_hour, 0) / 60, 2) AS uptime_last_hour,
+            ROUND(COALESCE(t.uptime_day, 0) / 3600, 2) AS uptime_last_day,
+            ROUND(COALESCE(t.uptime_week, 0) / 3600, 2) AS uptime_last_week,
+            ROUND(COALESCE(t.downtime_hour, 0) / 60, 2) AS downtime_last_hour,
+            ROUND(COALESCE(t.downtime_day, 0) / 3600, 2) AS downtime_last_day,
+            ROUND(COALESCE(t.downtime_week, 0) / 3600, 2) AS downtime_last_week
+        FROM stores st
+        LEFT JOIN totals t ON t.store_id = st.store_id
+        ORDER BY st.id
+    ) TO STDOUT WITH CSV HEADER
+"""
+
+def _minute_of_day(local_time: time) -> int:
+    """Convert a business hours boundary to minutes since midnight"""
+    return local_time.hour * 60 + local_time.minute
+
+@lru_cache(maxsize=None)
+def _week_bounds(business_hours: Tuple[Tuple[int, time, time], ...]) -> np.ndarray:
+    """
+    Flatten a schedule into sorted minute-of-week boundaries [open, close, open, close, ...]
+    where each opening covers [open, close). A minute is within business hours when an odd
+    number of boundaries lie at or before it.
+    """
+    bounds = []
+    for day, start, end in business_hours:
+        if end < start:
+            continue  # Matches nothing, as with the inclusive start <= t <= end check
+        bounds += [day * MINUTES_PER_DAY + _minute_of_day(start), day * MINUTES_PER_DAY + _minute_of_day(end) + 1]
+    return np.array(bounds, dtype=np.int32)
+
+@lru_cache(maxsize=512)
+def _tz(name: str) -> ZoneInfo:
+    """Get a cached timezone object by name"""
+    return ZoneInfo(name)
+
+def _to_utc(timestamp: datetime) -> pd.Timestamp:
+    """Normalize a datetime to UTC, treating naive values as UTC"""
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+
+def _status_chunk(rows) -> pd.DataFrame:
+    """Convert a chunk of status update rows to a DataFrame"""
+    chunk = pd.DataFrame.from_records(rows, columns=STATUS_COLUMNS)
+    chunk["timestamp_utc"] = pd.to_datetime(chunk["timestamp_utc"], utc=True)
+    return chunk
+
+def _status_frame(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate status update chunks, keeping the column types when there are none"""
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in STATUS_COLUMNS}).astype({"timestamp_utc": "datetime64[ns, UTC]"})
+    return pd.concat(chunks, ignore_index=True)
+
+def _is_open(timestamps: pd.DatetimeIndex, tz_name: str, business_hours: Tuple[Tuple[int, time, time], ...]) -> np.ndarray:
+    """Look up whether a store with this timezone and schedule is open at each UTC timestamp"""
+    local_time = timestamps.tz_convert(_tz(tz_name))
+    week_minute = np.asarray(local_time.weekday * MINUTES_PER_DAY + local_time.hour * 60 + local_time.minute, dtype=np.int32)
+    return np.searchsorted(_week_bounds(business_hours), week_minute, side="right") % 2 == 1
+
+def _business_hours_mask(frame: pd.DataFrame, stores: Dict[str, Dict]) -> pd.Series:
+    """Flag the status updates that fall within their store's local business hours"""
+    # Stores sharing a timezone and schedule are converted and looked up together
+    schedules = {}
+    store_schedules = {}
+    for store_id, data in stores.items():
+        key = (data["timezone"], data["business_hours"])
+        store_schedules[store_id] = schedules.setdefault(key, len(schedules))
+    schedule_keys = list(schedules)
+
+    mask = np.zeros(len(frame), dtype=bool)
+    for schedule, positions in frame.groupby(frame["store_id"].map(store_schedules), sort=False).indices.items():
+        tz_name, business_hours = schedule_keys[int(schedule)]
+        mask[positions] = _is_open(pd.DatetimeIndex(frame["timestamp_utc"].iloc[positions]), tz_name, business_hours)
+    return pd.Series(mask, index=frame.index)
+
+def _prepare_status_frame(frame: pd.DataFrame, stores: Dict[str, Dict]) -> pd.DataFrame:
+    """Annotate each status update with whether it is active and within business hours"""
+    frame = frame[frame["store_id"].isin(stores.keys())].reset_index(drop=True)
+    frame["active"] = frame["status"] == "active"
+    frame["in_hours"] = _business_hours_mask(frame, stores)
+    return frame
+
+# Serial on purpose: batches already run one process per core, and a threaded kernel would
+# multiply that and is not safe to call from several worker threads at once
+@njit(cache=True)
+def _uptime_downtime_kernel(timestamps, active, in_hours, offsets, window_starts, window_end, open_at_starts):
+    """
+    Uptime and downtime ns per store and window, as [uptime, downtime] pairs per window.
+    Store i's updates are timestamps[offsets[i]:offsets[i + 1]] (ns since epoch, sorted) with the
+    matching active/in_hours flags. Each status holds until the next update; a window starts with
+    the last status seen before it, or the first one seen if there is none, and the last status
+    runs to the window end. Durations are summed as int64 ns so the totals are exact.
+    """
+    store_count = offsets.shape[0] - 1
+    window_count = window_starts.shape[0]
+    totals = np.zeros((store_count, 2 * window_count), dtype=np.int64)
+    for store in range(store_count):
+        lo = offsets[store]
+        hi = offsets[store + 1]
+        for window in range(window_count):
+            window_start = window_starts[window]
+            first = lo + np.searchsorted(timestamps[lo:hi], window_start)
+            last = lo + np.searchsorted(timestamps[lo:hi], window_end, side="right")
+
+            up = 0
+            down = 0
+            # Interval from the window start to the first update in it
+            boundary = window_end if first == last else timestamps[first]
+            if open_at_starts[store, window]:
+                if active[max(first - 1, lo)]:
+                    up += boundary - window_start
+                else:
+                    down += boundary - window_start
+            for position in range(first, last):
+                boundary = window_end if position + 1 == last else timestamps[position + 1]
+                if in_hours[position]:
+                    if active[position]:
+                        up += boundary - timestamps[position]
+                    else:
+                        down += boundary - timestamps[position]
+            totals[store, 2 * window] = up
+            totals[store, 2 * window + 1] = down
+    return totals
+
+def _calculate_uptime_downtime(frame: pd.DataFrame, stores: Dict[str, Dict], last_hour: datetime, last_day: datetime,
+                               last_week: datetime, end_time: datetime) -> pd.DataFrame:
+    """Calculate uptime and downtime ns per store for the last hour, day and week"""
+    periods = ("hour", "day", "week")
+    period_starts = pd.DatetimeIndex([_to_utc(last_hour), _to_utc(last_day), _to_utc(last_week)])
+    columns = [f"{metric}_{period}" for period in periods for metric in ("uptime", "downtime")]
+    if frame.empty:
+        return pd.DataFrame(columns=columns, dtype=np.int64)
+
+    # Lay the updates out store by store (the frame is usually already in that order)
+    codes, store_ids = pd.factorize(frame["store_id"], sort=False)
+    order = np.argsort(codes, kind="stable")
+    offsets = np.zeros(len(store_ids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(codes, minlength=len(store_ids)))
+
+    timestamps = frame["timestamp_utc"].values.astype("datetime64[ns]").view("int64")[order]
+    active = frame["active"].values[order].astype(np.uint8)
+    in_hours = frame["in_hours"].values[order].astype(np.uint8)
+
+    # Business hours at the period starts only depend on the store's timezone and schedule
+    open_at_starts = np.empty((len(store_ids), len(periods)), dtype=np.uint8)
+    schedules = {}
+    for position, store_id in enumerate(store_ids):
+        schedule = (stores[store_id]["timezone"], stores[store_id]["business_hours"])
+        if schedule not in schedules:
+            schedules[schedule] = _is_open(period_starts, *schedule)
+        open_at_starts[position] = schedules[schedule]
+
+    totals = _uptime_downtime_kernel(
+        np.ascontiguousarray(timestamps), active, in_hours, offsets, period_starts.asi8,
+        _to_utc(end_time).value, open_at_starts
+    )
+    return pd.DataFrame(totals, index=store_ids, columns=columns)
+
+def _round_half_up(totals: pd.Series, unit: int) -> np.ndarray:
+    """Convert exact ns totals to the unit, rounded to 2 decimals with halves rounded up like PostgreSQL's ROUND"""
+    return ((totals.values * 100 + unit // 2) // unit) / 100
+
+def _build_results(store_ids: List[str], totals: pd.DataFrame) -> pd.DataFrame:
+    """Assemble report rows from per-store uptime/downtime ns"""
+    totals = totals.reindex(store_ids, fill_value=0)
+    return pd.DataFrame({
+        "store_id": store_ids,
+        "uptime_last_hour": _round_half_up(totals["uptime_hour"], NS_PER_MINUTE),
+        "uptime_last_day": _round_half_up(totals["uptime_day"], NS_PER_HOUR),
+        "uptime_last_week": _round_half_up(totals["uptime_week"], NS_PER_HOUR),
+        "downtime_last_hour": _round_half_up(totals["downtime_hour"], NS_PER_MINUTE),
+        "downtime_last_day": _round_half_up(totals["downtime_day"], NS_PER_HOUR),
+        "downtime_last_week": _round_half_up(totals["downtime_week"], NS_PER_HOUR)
+    })
+
+def _process_batch(stores: Dict[str, Dict], frame: pd.DataFrame, last_hour: datetime, last_day: datetime,
+                   last_week: datetime, end_time: datetime) -> pd.DataFrame:
+    """Compute the report rows for one batch of stores. Runs in a worker process, so it only touches the data passed in"""
+    frame = _prepare_status_frame(frame, stores)
+    return _build_results(list(stores), _calculate_uptime_downtime(frame, stores, last_hour, last_day, last_week, end_time))
+
 class ReportService:
     def __init__(self, db: Session):
         self.db = db
@@ -18,12 +307,29 @@ class ReportService:
         # Configuration for batch processing
         # Set to -1 to process all batches, or set to a specific batch number (1-based) to process only that batch
         self.process_batch = -1  # Default to process all batches
+        # Set to True to compute uptime/downtime with window functions in PostgreSQL instead of pandas
+        self.aggregate_in_db = False
+        # Worker processes for in-memory batches. None uses every core, 1 processes batches in this process
+        self.max_workers = None
+        # Stores with the same business hours share one normalized value, so each distinct
+        # schedule is normalized once and pickled once per batch sent to a worker
+        self._business_hours_cache = {}
 
     def set_process_batch(self, batch_number: int):
         """Set which batch to process. -1 for all batches, or specific batch number (1-based)"""
         self.process_batch = batch_number
         logger.info(f"Set to process batch: {batch_number if batch_number > 0 else 'ALL'}")
 
+    def set_aggregate_in_db(self, enabled: bool):
+        """Compute uptime/downtime in the db (PostgreSQL only) instead of in memory"""
+        self.aggregate_in_db = enabled
+        logger.info(f"Set to aggregate in: {'db' if enabled else 'memory'}")
+
+    def set_max_workers(self, max_workers: Optional[int]):
+        """Set the number of worker processes for in-memory batches. None for one per core"""
+        self.max_workers = max_workers
+        logger.info(f"Set max workers: {max_workers or 'ALL cores'}")
+
     def create_report(self, report_id: str) -> Report:
         """Create a new report record"""
         report = Report(
@@ -37,94 +343,196 @@ class ReportService:
 
     def get_report(self, report_id: str) -> Report:
         """Get report by ID"""
-        return self.db.query(Report).filter(Report.report_id == report_id).first()
+        return self.db.scalars(select(Report).where(Report.report_id == report_id)).first()
+
+    def fail_report(self, report_id: str):
+        """Mark a report as failed, discarding whatever the interrupted generation left in the session"""
+        # A failed statement aborts the transaction, so roll back before recording the failure
+        self.db.rollback()
+        report = self.get_report(report_id)
+        if report is not None:
+            report.status = ReportStatus.FAILED
+            self.db.commit()
+
+    def _get_store_timezone(self, timezone: Optional[str]) -> str:
+        """Get store timezone, or the default when it is missing or unknown"""
+        if not timezone:
+            return DEFAULT_TIMEZONE
+        try:
+            _tz(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Unknown timezone {timezone!r}, using {DEFAULT_TIMEZONE}")
+            return DEFAULT_TIMEZONE
+        return timezone
 
-    def _get_store_timezone(self, store_id: str) -> str:
-        """Get store timezone or return default"""
-        store = self.db.query(Store).filter(Store.store_id == store_id).first()
-        return store.timezone if store else "America/Chicago"
+    def _get_business_hours(self, hours: Optional[List[Tuple[int, time, time]]]) -> Tuple[Tuple[int, time, time], ...]:
+        """Normalize a store's business hours rows to (day, start, end), sorted by day"""
+        key = tuple(hours or ())
+        if key in self._business_hours_cache:
+            return self._business_hours_cache[key]
 
-    def _get_business_hours(self, store_id: str) -> List[Dict]:
-        """Get business hours for a store"""
-        hours = self.db.query(BusinessHours).filter(BusinessHours.store_id == store_id).all()
         if not hours:
             # Default to 24/7 if no hours specified
-            return [{"day": i, "start": "00:00", "end": "23:59"} for i in range(7)]
-        return [{"day": h.day_of_week, "start": h.start_time_local, "end": h.end_time_local} for h in hours]
-
-    def _is_within_business_hours(self, timestamp: datetime, store_id: str) -> bool:
-        """Check if timestamp is within business hours"""
-        timezone = pytz.timezone(self._get_store_timezone(store_id))
-        local_time = timestamp.astimezone(timezone)
-        day_of_week = local_time.weekday()
-        time_str = local_time.strftime("%H:%M")
-        
-        business_hours = self._get_business_hours(store_id)
-        for hours in business_hours:
-            if hours["day"] == day_of_week:
-                return hours["start"] <= time_str <= hours["end"]
-        return False
-
-    def _calculate_uptime_downtime(self, store_id: str, start_time: datetime, end_time: datetime) -> Tuple[float, float]:
-        """Calculate uptime and downtime for a given time period"""
-        logger.debug(f"Calculating uptime/downtime for store {store_id} from {start_time} to {end_time}")
+            normalized = tuple((i, time(0, 0), time(23, 59)) for i in range(7))
+        else:
+            days = {}
+            for day, start, end in hours:
+                # The first entry for a day wins
+                days.setdefault(day, (day, start, end))
+            normalized = tuple(days[day] for day in sorted(days))
+        self._business_hours_cache[key] = normalized
+        return normalized
+
+    def _load_stores(self) -> Dict[str, Dict]:
+        """Load every store together with its business hours as plain rows"""
+        hours = {}
+        for store_id, day, start, end in self.db.execute(
+            select(BusinessHours.store_id, BusinessHours.day_of_week, BusinessHours.start_time_local, BusinessHours.end_time_local)
+            .order_by(BusinessHours.id)
+        ):
+            hours.setdefault(store_id, []).append((day, start, end))
+
+        return {
+            store_id: {
+                "timezone": self._get_store_timezone(timezone),
+                "business_hours": self._get_business_hours(hours.get(store_id)),
+            }
+            for store_id, timezone in self.db.execute(select(Store.store_id, Store.timezone).order_by(Store.id))
+        }
+
+    def _status_query(self, start_time: datetime, end_time: datetime):
+        """Select the status updates in the time range ordered by store and time"""
+        return select(StoreStatus.store_id, StoreStatus.timestamp_utc, StoreStatus.status)\
+            .where(StoreStatus.timestamp_utc.between(start_time, end_time))\
+            .order_by(StoreStatus.store_id, StoreStatus.timestamp_utc)
+
+    def _load_status_frame(self, start_time: datetime, end_time: datetime) -> pd.DataFrame:
+        """Load all status updates in the time range into a DataFrame ordered by store and time"""
+        # yield_per streams the rows through a server-side cursor instead of fetching them all at once
+        status_updates = self.db.execute(
+            self._status_query(start_time, end_time),
+            execution_options={"yield_per": STATUS_CHUNK_SIZE},
+        )
+        # Convert partition by partition so at most one chunk of row tuples is alive at a time
+        return _status_frame([_status_chunk(partition) for partition in status_updates.partitions()])
+
+    async def _load_batch_status_frames_async(self, batches: List[List[str]], start_time: datetime, end_time: datetime) -> List[pd.DataFrame]:
+        """Load each batch's status updates with its own query, running up to ASYNC_QUERY_CONCURRENCY at once"""
+        async_engine = create_async_db_engine(self.db.get_bind().url, pool_size=ASYNC_QUERY_CONCURRENCY, max_overflow=0)
+        semaphore = asyncio.Semaphore(ASYNC_QUERY_CONCURRENCY)
+
+        async def load(batch: List[str]) -> pd.DataFrame:
+            async with semaphore, async_engine.connect() as conn:
+                status_updates = await conn.stream(
+                    self._status_query(start_time, end_time).where(StoreStatus.store_id.in_(batch)),
+                    execution_options={"yield_per": STATUS_CHUNK_SIZE},
+                )
+                return _status_frame([_status_chunk(partition) async for partition in status_updates.partitions()])
+
+        try:
+            return await asyncio.gather(*(load(batch) for batch in batches))
+        finally:
+            # The asyncpg connections belong to this event loop
+            await async_engine.dispose()
+
+    def _load_batch_status_frames(self, batches: List[List[str]], start_time: datetime, end_time: datetime) -> List[pd.DataFrame]:
+        """Load the status updates in the time range for each batch of stores"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            # Overlap the per-batch round trips on concurrent asyncpg connections
+            return asyncio.run(self._load_batch_status_frames_async(batches, start_time, end_time))
+
+        # Otherwise stream everything in one query and split it by batch in one pass
+        frame = self._load_status_frame(start_time, end_time)
+        batch_numbers = {store_id: number for number, batch in enumerate(batches) for store_id in batch}
+        batch_positions = frame.groupby(frame["store_id"].map(batch_numbers).fillna(-1).astype(int)).indices
+        return [frame.iloc[batch_positions.get(number, [])] for number in range(len(batches))]
+
+    def _export_report_in_db(self, last_hour: datetime, last_day: datetime, last_week: datetime, end_time: datetime, file_path: str) -> int:
+        """Compute the report in the db and COPY it straight into the CSV file, returning the row count"""
+        if self.process_batch != -1:
+            logger.warning("Batch selection is ignored when aggregating in the db")
+
+        cursor = self.db.connection().connection.cursor()
+        try:
+            # Look back over the same week of data the in-memory path loads
+            copy_sql = cursor.mogrify(REPORT_COPY_SQL, {
+                "last_hour": last_hour,
+                "last_day": last_day,
+                "last_week": last_week,
+                "end_time": end_time,
+                "default_timezone": DEFAULT_TIMEZONE,
+            }).decode()
+            with open(file_path, "w") as f:
+                cursor.copy_expert(copy_sql, f)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def _generate_results(self, last_hour: datetime, last_day: datetime, last_week: datetime, end_time: datetime) -> pd.DataFrame:
+        """Compute the report in memory, spreading the batches over worker processes"""
+        start_time = datetime.utcnow()
+
+        logger.info("Fetching all stores and business hours from db")
+        store_data = self._load_stores()
+        stores = list(store_data)
+        logger.info(f"Found {len(stores)} stores to process")
+
+        # Process stores in batches
+        batch_size = 100
+        total_batches = (len(stores) + batch_size - 1) // batch_size
         
-        # Get all status updates for the store in the time range in a single query
-        status_updates = self.db.query(StoreStatus)\
-            .filter(StoreStatus.store_id == store_id)\
-            .filter(StoreStatus.timestamp_utc.between(start_time, end_time))\
-            .order_by(StoreStatus.timestamp_utc)\
-            .all()
-
-        if not status_updates:
-            logger.debug(f"No status updates found for store {store_id} in the given time range")
-            return 0, 0
-
-        logger.debug(f"Found {len(status_updates)} status updates for store {store_id}")
-
-        # Get business hours once for the store
-        business_hours = self._get_business_hours(store_id)
-        timezone = pytz.timezone(self._get_store_timezone(store_id))
-        logger.debug(f"Store {store_id} timezone: {timezone}")
-
-        uptime_minutes = 0
-        downtime_minutes = 0
-        total_processed = 0
-        skipped_outside_hours = 0
-
-        for i in range(len(status_updates) - 1):
-            current = status_updates[i]
-            next_update = status_updates[i + 1]
-            
-            # Convert to local time once
-            local_time = current.timestamp_utc.astimezone(timezone)
-            day_of_week = local_time.weekday()
-            time_str = local_time.strftime("%H:%M")
-            
-            # Check business hours
-            is_within_hours = False
-            for hours in business_hours:
-                if hours["day"] == day_of_week:
-                    is_within_hours = hours["start"] <= time_str <= hours["end"]
-                    break
-
-            if not is_within_hours:
-                skipped_outside_hours += 1
-                continue
-
-            time_diff = (next_update.timestamp_utc - current.timestamp_utc).total_seconds() / 60
-            if current.status == "active":
-                uptime_minutes += time_diff
-            else:
-                downtime_minutes += time_diff
-            total_processed += 1
+        # Determine which batches to process
+        if self.process_batch == -1:
+            batches_to_process = range(0, len(stores), batch_size)
+            logger.info("Processing ALL batches")
+        else:
+            if self.process_batch < 1 or self.process_batch > total_batches:
+                raise ValueError(f"Invalid batch number: {self.process_batch}. Must be between 1 and {total_batches}")
+            start_idx = (self.process_batch - 1) * batch_size
+            batches_to_process = [start_idx]
+            logger.info(f"Processing only batch {self.process_batch} of {total_batches}")
+
+        # Each worker only receives its own batch of stores and status updates
+        batches = [stores[i:i+batch_size] for i in batches_to_process]
+        batch_stores = [{store_id: store_data[store_id] for store_id in batch} for batch in batches]
+        logger.info("Fetching status updates from db")
+        batch_frames = self._load_batch_status_frames(batches, last_week, end_time)
+
+        process_batch = partial(_process_batch, last_hour=last_hour, last_day=last_day, last_week=last_week, end_time=end_time)
+        workers = min(self.max_workers or os.cpu_count() or 1, len(batch_stores))
+        logger.info(f"Processing {len(batch_stores)} batches with {workers} worker(s)")
+
+        results = []
+        # Spawn rather than fork: this runs in one of the dramatiq worker's threads, and forking a
+        # threaded process can deadlock the child
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) if workers > 1 else None
+        try:
+            batch_results = executor.map(process_batch, batch_stores, batch_frames) if executor else map(process_batch, batch_stores, batch_frames)
+            for done, (i, result) in enumerate(zip(batches_to_process, batch_results), 1):
+                current_batch = i // batch_size + 1
+                results.append(result)
+                
+                batch_end_time = datetime.utcnow()
+                logger.info(f"Completed batch {current_batch}/{total_batches} ({len(result)} stores)")
+                
+                # Calculate and log progress
+                progress = (done / len(batch_stores)) * 100
+                elapsed_time = (batch_end_time - start_time).total_seconds()
+                estimated_total_time = elapsed_time / (done / len(batch_stores))
+                remaining_time = estimated_total_time - elapsed_time
+                
+                logger.info(f"Progress: {progress:.1f}% complete. "
+                          f"Estimated time remaining: {remaining_time/60:.1f} minutes")
+        finally:
+            if executor:
+                # Drop queued batches if the report was interrupted (e.g. by the worker time limit)
+                executor.shutdown(cancel_futures=True)
 
-        logger.debug(f"Store {store_id} metrics: uptime={uptime_minutes:.2f}min, downtime={downtime_minutes:.2f}min, "
-                    f"processed={total_processed}, skipped={skipped_outside_hours}")
-        return uptime_minutes, downtime_minutes
+        logger.info("Creating DataFrame from results...")
+        return pd.concat(results, ignore_index=True)
 
     def generate_report(self, report_id: str):
-        """Generate the report in background"""
+        """Generate the report and record whether it completed or failed. Run by the report worker"""
         start_time = datetime.utcnow()
         logger.info(f"Starting report generation for report_id: {report_id} at {start_time}")
         
@@ -134,105 +542,36 @@ class ReportService:
                 logger.error(f"Report not found for report_id: {report_id}")
                 return
 
-            logger.info("Fetching all stores from db")
-            stores = self.db.query(Store).all()
-            logger.info(f"Found {len(stores)} stores to process")
-
             # Get the time range from the data
-            oldest_status = self.db.query(StoreStatus).order_by(StoreStatus.timestamp_utc).first()
-            newest_status = self.db.query(StoreStatus).order_by(StoreStatus.timestamp_utc.desc()).first()
+            oldest_timestamp, newest_timestamp = self.db.execute(
+                select(func.min(StoreStatus.timestamp_utc), func.max(StoreStatus.timestamp_utc))
+            ).one()
             
-            if not oldest_status or not newest_status:
+            if oldest_timestamp is None or newest_timestamp is None:
                 logger.error("No status data found in the db")
                 report.status = ReportStatus.FAILED
                 self.db.commit()
                 return
 
             # Calculate time ranges based on the data
-            end_time = newest_status.timestamp_utc
+            end_time = newest_timestamp
             last_hour = end_time - timedelta(hours=1)
             last_day = end_time - timedelta(days=1)
             last_week = end_time - timedelta(weeks=1)
             
-            logger.info(f"Using data time range: {oldest_status.timestamp_utc} to {end_time}")
+            logger.info(f"Using data time range: {oldest_timestamp} to {end_time}")
 
-            # Process stores in batches
-            batch_size = 100
-            results = []
-            total_batches = (len(stores) + batch_size - 1) // batch_size
-            
-            # Determine which batches to process
-            if self.process_batch == -1:
-                batches_to_process = range(0, len(stores), batch_size)
-                logger.info("Processing ALL batches")
+            if self.aggregate_in_db:
+                # COPY streams CSV straight from the db, so this path keeps writing CSV
+                file_path = os.path.join(self.reports_dir, f"report_{report_id}.csv")
+                logger.info(f"Aggregating uptime/downtime in the db and copying the report to {file_path}")
+                store_count = self._export_report_in_db(last_hour, last_day, last_week, end_time, file_path)
             else:
-                if self.process_batch < 1 or self.process_batch > total_batches:
-                    logger.error(f"Invalid batch number: {self.process_batch}. Must be between 1 and {total_batches}")
-                    report.status = ReportStatus.FAILED
-                    self.db.commit()
-                    return
-                start_idx = (self.process_batch - 1) * batch_size
-                batches_to_process = [start_idx]
-                logger.info(f"Processing only batch {self.process_batch} of {total_batches}")
-            
-            for i in batches_to_process:
-                batch_start_time = datetime.utcnow()
-                batch = stores[i:i+batch_size]
-                current_batch = i // batch_size + 1
-                logger.info(f"\n{'='*50}")
-                logger.info(f"Processing batch {current_batch}/{total_batches} ({len(batch)} stores)")
-                
-                batch_results = []
-                for store_index, store in enumerate(batch, 1):
-                    store_start_time = datetime.utcnow()
-                    logger.info(f"Processing store {i + store_index}/{len(stores)}: {store.store_id}")
-                    
-                    # Calculate metrics for different time periods
-                    uptime_hour, downtime_hour = self._calculate_uptime_downtime(store.store_id, last_hour, end_time)
-                    uptime_day, downtime_day = self._calculate_uptime_downtime(store.store_id, last_day, end_time)
-                    uptime_week, downtime_week = self._calculate_uptime_downtime(store.store_id, last_week, end_time)
-
-                    store_results = {
-                        "store_id": store.store_id,
-                        "uptime_last_hour": round(uptime_hour, 2),
-                        "uptime_last_day": round(uptime_day / 60, 2),  # Convert to hours
-                        "uptime_last_week": round(uptime_week / 60, 2),  # Convert to hours
-                        "downtime_last_hour": round(downtime_hour, 2),
-                        "downtime_last_day": round(downtime_day / 60, 2),  # Convert to hours
-                        "downtime_last_week": round(downtime_week / 60, 2)  # Convert to hours
-                    }
-                    
-                    store_end_time = datetime.utcnow()
-                    store_duration = (store_end_time - store_start_time).total_seconds()
-                    logger.info(f"Completed store {store.store_id} in {store_duration:.2f} seconds")
-                    
-                    batch_results.append(store_results)
-                
-                results.extend(batch_results)
-                
-                # Commit after each batch to prevent memory issues
-                self.db.commit()
-                
-                batch_end_time = datetime.utcnow()
-                batch_duration = (batch_end_time - batch_start_time).total_seconds()
-                logger.info(f"Completed batch {current_batch}/{total_batches} in {batch_duration:.2f} seconds")
-                
-                # Calculate and log progress
-                progress = (current_batch / total_batches) * 100
-                elapsed_time = (batch_end_time - start_time).total_seconds()
-                estimated_total_time = elapsed_time / (current_batch / total_batches)
-                remaining_time = estimated_total_time - elapsed_time
-                
-                logger.info(f"Progress: {progress:.1f}% complete. "
-                          f"Estimated time remaining: {remaining_time/60:.1f} minutes")
-                logger.info(f"{'='*50}\n")
-
-            logger.info("Creating DataFrame from results...")
-            # Create DataFrame and save to CSV
-            df = pd.DataFrame(results)
-            file_path = os.path.join(self.reports_dir, f"report_{report_id}.csv")
-            logger.info(f"Saving report to {file_path}")
-            df.to_csv(file_path, index=False)
+                file_path = os.path.join(self.reports_dir, f"report_{report_id}.parquet")
+                df = self._generate_results(last_hour, last_day, last_week, end_time)
+                logger.info(f"Saving report to {file_path}")
+                df.to_parquet(file_path, index=False, compression="zstd")
+                store_count = len(df)
 
             # Update report status
             logger.info("Updating report status to completed...")
@@ -245,10 +584,8 @@ class ReportService:
             total_duration = (end_time - start_time).total_seconds()
             logger.info(f"Report generation completed successfully for report_id: {report_id}")
             logger.info(f"Total processing time: {total_duration/60:.1f} minutes")
-            logger.info(f"Average time per store: {total_duration/len(stores):.2f} seconds")
-            logger.info(f"Average time per batch: {total_duration/total_batches:.2f} seconds")
+            logger.info(f"Average time per store: {total_duration/max(store_count, 1):.2f} seconds")
 
         except Exception as e:
             logger.error(f"Error generating report {report_id}: {str(e)}", exc_info=True)
-            report.status = ReportStatus.FAILED
-            self.db.commit() 
\ No newline at end of file
+            self.fail_report(report_id)
@@ -0,0 +1,36 @@
+import dramatiq
+from dramatiq.brokers.redis import RedisBroker
+from dramatiq.middleware import TimeLimitExceeded
+import os
+from dotenv import load_dotenv
+from app.database import SessionLocal
+from app.services.report_service import ReportService
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Compute uptime/downtime in PostgreSQL instead of pandas
+AGGREGATE_IN_DB = os.getenv("AGGREGATE_IN_DB", "false").lower() in ("1", "true", "yes")
+
+dramatiq.set_broker(RedisBroker(url=REDIS_URL))
+
+# generate_report marks the report as failed itself, so a retry would only redo the work.
+# Reports over a week of data can take a while, so allow up to an hour. Hitting the limit raises
+# TimeLimitExceeded, a BaseException that generate_report's except Exception does not see.
+@dramatiq.actor(max_retries=0, time_limit=60 * 60 * 1000)
+def generate_report(report_id: str):
+    """Generate a report in the worker process with its own db session"""
+    logger.info(f"Worker picked up report {report_id}")
+    with SessionLocal() as db:
+        report_service = ReportService(db)
+        report_service.set_aggregate_in_db(AGGREGATE_IN_DB)
+        try:
+            report_service.generate_report(report_id)
+        except TimeLimitExceeded:
+            logger.error(f"Report {report_id} exceeded the worker time limit")
+            report_service.fail_report(report_id)
+            raise
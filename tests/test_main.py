@@ -0,0 +1,30 @@
+import pandas as pd
+
+from app.main import _parquet_to_csv
+
+
+def _report(rows):
+    return pd.DataFrame({
+        "store_id": [f"store_{number}" for number in range(rows)],
+        "uptime_last_hour": [number / 4 for number in range(rows)],
+        "downtime_last_week": [0.61] * rows,
+    })
+
+
+def test_parquet_to_csv_streams_in_batches(tmp_path):
+    report = _report(150_000)
+    file_path = tmp_path / "report.parquet"
+    report.to_parquet(file_path, index=False)
+
+    chunks = list(_parquet_to_csv(str(file_path)))
+
+    # The header, then one chunk per pyarrow batch of up to 65536 rows
+    assert len(chunks) == 1 + 3
+    assert "".join(chunks) == report.to_csv(index=False)
+
+
+def test_parquet_to_csv_keeps_the_header_for_an_empty_report(tmp_path):
+    file_path = tmp_path / "report.parquet"
+    _report(0).to_parquet(file_path, index=False)
+
+    assert "".join(_parquet_to_csv(str(file_path))) == "store_id,uptime_last_hour,downtime_last_week\n"
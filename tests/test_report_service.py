@@ -0,0 +1,221 @@
+"""
+Compare the in-memory report against a plain-Python reference implementation of the
+extrapolation rules, on a SQLite database seeded with random stores, and the PostgreSQL
+paths against the in-memory one.
+"""
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import random
+
+import pandas as pd
+import pytest
+
+from app.models.models import BusinessHours, ReportStatus, Store, StoreStatus
+from app.services.report_service import (
+    DEFAULT_TIMEZONE, NS_PER_HOUR, NS_PER_MINUTE, STATUS_COLUMNS, ReportService, _build_results
+)
+
+END_TIME = datetime(2023, 1, 25, 18, 0)
+TIMEZONES = ["America/Chicago", "America/New_York", "Asia/Kolkata", "Europe/Berlin", None, "", "Mars/Olympus_Mons"]
+PERIODS = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+
+
+def _seed(db, store_count=150, seed=7):
+    """Random stores, business hours and status updates over the 9 days up to END_TIME"""
+    rng = random.Random(seed)
+    for number in range(store_count):
+        store_id = f"store_{number:03d}"
+        db.add(Store(store_id=store_id, timezone=rng.choice(TIMEZONES)))
+        if number % 4:
+            for day in range(7):
+                if rng.random() < 0.8:
+                    start = time(rng.randint(0, 11), rng.choice([0, 30]))
+                    end = time(rng.randint(12, 23), rng.choice([0, 59]))
+                    db.add(BusinessHours(store_id=store_id, day_of_week=day, start_time_local=start, end_time_local=end))
+                if rng.random() < 0.1:
+                    # A second entry for the day, which must be ignored
+                    db.add(BusinessHours(store_id=store_id, day_of_week=day, start_time_local=time(0, 0), end_time_local=time(23, 59)))
+
+        if number % 13 == 5:
+            continue  # No status updates at all
+        # Stores that only report before the week window, or stop reporting before the last hour/day
+        last_seen = END_TIME - rng.choice([timedelta(0), timedelta(0), timedelta(minutes=90), timedelta(hours=30), timedelta(days=8)])
+        timestamp = END_TIME - timedelta(days=9)
+        while timestamp < last_seen:
+            timestamp = min(timestamp + timedelta(minutes=rng.randint(20, 120), seconds=rng.randint(0, 59)), last_seen)
+            db.add(StoreStatus(store_id=store_id, timestamp_utc=timestamp, status=rng.choice(["active"] * 4 + ["inactive"])))
+    # Pin the report end time
+    db.add(StoreStatus(store_id="store_000", timestamp_utc=END_TIME, status="active"))
+    db.commit()
+
+
+def _reference_report(db):
+    """Uptime/downtime per store following the documented rules, one interval at a time"""
+    def timezone_name(name):
+        try:
+            return name if name and ZoneInfo(name) else DEFAULT_TIMEZONE
+        except ZoneInfoNotFoundError:
+            return DEFAULT_TIMEZONE
+
+    timezones = {store.store_id: timezone_name(store.timezone) for store in db.query(Store)}
+    hours = {}
+    for entry in db.query(BusinessHours).order_by(BusinessHours.id):
+        hours.setdefault(entry.store_id, {}).setdefault(entry.day_of_week, (entry.start_time_local, entry.end_time_local))
+    updates = {}
+    for status in db.query(StoreStatus).order_by(StoreStatus.store_id, StoreStatus.timestamp_utc):
+        updates.setdefault(status.store_id, []).append((status.timestamp_utc, status.status == "active"))
+    end_time = max(timestamp for rows in updates.values() for timestamp, _ in rows)
+
+    def is_open(store_id, timestamp):
+        if store_id not in hours:
+            return True
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        local = timestamp.astimezone(ZoneInfo(timezones[store_id]))
+        if local.weekday() not in hours[store_id]:
+            return False
+        start, end = hours[store_id][local.weekday()]
+        return start <= local.time().replace(second=0, microsecond=0) <= end
+
+    report = {}
+    for store_id in timezones:
+        observed = [row for row in updates.get(store_id, []) if end_time - PERIODS["week"] <= row[0] <= end_time]
+        row = {}
+        for period, length in PERIODS.items():
+            window_start = end_time - length
+            uptime = downtime = 0.0
+            if observed:
+                before = [active for timestamp, active in observed if timestamp < window_start]
+                inside = [update for update in observed if update[0] >= window_start]
+                points = [(window_start, before[-1] if before else observed[0][1])] + inside
+                for position, (timestamp, active) in enumerate(points):
+                    following = points[position + 1][0] if position + 1 < len(points) else end_time
+                    if not is_open(store_id, timestamp):
+                        continue
+                    minutes = (following - timestamp).total_seconds() / 60
+                    if active:
+                        uptime += minutes
+                    else:
+                        downtime += minutes
+            scale = 1 if period == "hour" else 60  # Day and week are reported in hours
+            row[f"uptime_last_{period}"] = uptime / scale
+            row[f"downtime_last_{period}"] = downtime / scale
+        report[store_id] = row
+    return report
+
+
+def _assert_matches_reference(result, expected):
+    for store_id, row in result.iterrows():
+        for column, value in expected[store_id].items():
+            # The report is rounded to 2 decimals
+            assert row[column] == pytest.approx(value, abs=0.0051), f"{store_id} {column}"
+
+
+def _run_report(db, report_id, aggregate_in_db=False, process_batch=-1):
+    """Generate a report in a single process and return it"""
+    report_service = ReportService(db)
+    report_service.set_max_workers(1)
+    report_service.set_aggregate_in_db(aggregate_in_db)
+    report_service.set_process_batch(process_batch)
+    report_service.create_report(report_id)
+    report_service.generate_report(report_id)
+    return report_service.get_report(report_id)
+
+
+@pytest.mark.parametrize("process_batch", [-1, 2])
+def test_report_matches_reference(db, tmp_path, monkeypatch, process_batch):
+    monkeypatch.chdir(tmp_path)
+    _seed(db)
+
+    report = _run_report(db, "report", process_batch=process_batch)
+
+    assert report.status == ReportStatus.COMPLETED
+    result = pd.read_parquet(report.file_path).set_index("store_id")
+    expected = _reference_report(db)
+    if process_batch == -1:
+        assert set(result.index) == set(expected)
+    else:
+        assert 0 < len(result) < len(expected)
+    _assert_matches_reference(result, expected)
+
+
+def test_report_fails_without_status_data(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    report_service = ReportService(db)
+    report_service.create_report("report")
+
+    report_service.generate_report("report")
+
+    assert report_service.get_report("report").status == ReportStatus.FAILED
+
+
+def test_results_round_halves_up():
+    totals = pd.DataFrame({
+        "uptime_hour": [NS_PER_MINUTE // 8],  # 0.125 minutes
+        "downtime_hour": [0],
+        "uptime_day": [20718 * 10**9],  # 5.755 hours
+        "downtime_day": [2178 * 10**9],  # 0.605 hours
+        "uptime_week": [NS_PER_HOUR * 3 // 8],  # 0.375 hours
+        "downtime_week": [NS_PER_HOUR - 1],
+    }, index=["store"])
+
+    row = _build_results(["store", "missing"], totals).set_index("store_id")
+
+    assert row.loc["store"].tolist() == [0.13, 5.76, 0.38, 0.0, 0.61, 1.0]
+    assert row.loc["missing"].tolist() == [0.0] * 6
+
+
+def test_db_aggregation_matches_in_memory(pg_db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _seed(pg_db)
+
+    in_memory = _run_report(pg_db, "in_memory")
+    in_db = _run_report(pg_db, "in_db", aggregate_in_db=True)
+
+    assert in_memory.status == in_db.status == ReportStatus.COMPLETED
+    pd.testing.assert_frame_equal(
+        pd.read_csv(in_db.file_path, float_precision="round_trip"),
+        pd.read_parquet(in_memory.file_path),
+        check_dtype=False,
+    )
+
+
+def test_export_in_db_matches_reference(pg_db, tmp_path):
+    _seed(pg_db)
+    end_time = END_TIME.replace(tzinfo=timezone.utc)
+    file_path = tmp_path / "report.csv"
+
+    row_count = ReportService(pg_db)._export_report_in_db(
+        end_time - PERIODS["hour"], end_time - PERIODS["day"], end_time - PERIODS["week"], end_time, str(file_path)
+    )
+
+    result = pd.read_csv(file_path)
+    store_ids = [store.store_id for store in pg_db.query(Store).order_by(Store.id)]
+    assert row_count == len(result) == len(store_ids)
+    assert list(result.columns) == [
+        "store_id", "uptime_last_hour", "uptime_last_day", "uptime_last_week",
+        "downtime_last_hour", "downtime_last_day", "downtime_last_week",
+    ]
+    assert result["store_id"].tolist() == store_ids
+    _assert_matches_reference(result.set_index("store_id"), _reference_report(pg_db))
+
+
+def test_async_batch_loader_matches_single_query(pg_db):
+    _seed(pg_db)
+    report_service = ReportService(pg_db)
+    store_ids = [store.store_id for store in pg_db.query(Store).order_by(Store.id)]
+    # store_005 has no status updates
+    batches = [store_ids[:100], ["store_005"], store_ids[100:]]
+    end_time = END_TIME.replace(tzinfo=timezone.utc)
+    start_time = end_time - PERIODS["week"]
+
+    frames = report_service._load_batch_status_frames(batches, start_time, end_time)
+
+    everything = report_service._load_status_frame(start_time, end_time)
+    assert len(frames) == len(batches)
+    assert sum(len(frame) for frame in frames) == len(everything)
+    for batch, frame in zip(batches, frames):
+        assert list(frame.columns) == STATUS_COLUMNS
+        expected = everything[everything["store_id"].isin(batch)].reset_index(drop=True)
+        pd.testing.assert_frame_equal(frame.reset_index(drop=True), expected)
+    assert frames[1].empty
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from dramatiq.middleware import TimeLimitExceeded
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import worker
+from app.models.models import ReportStatus, Store, StoreStatus
+from app.services.report_service import ReportService
+
+
+def test_timed_out_report_is_marked_failed(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(worker, "SessionLocal", sessionmaker(bind=db.get_bind()))
+
+    def time_out(self, *args):
+        # Leave a pending change behind, as an interrupted report would
+        self.get_report("report").file_path = "partial.parquet"
+        raise TimeLimitExceeded()
+
+    monkeypatch.setattr(ReportService, "_generate_results", time_out)
+    db.add_all([Store(store_id="store"), StoreStatus(store_id="store", timestamp_utc=datetime(2023, 1, 25), status="active")])
+    ReportService(db).create_report("report")
+
+    with pytest.raises(TimeLimitExceeded):
+        worker.generate_report.fn("report")
+
+    db.expire_all()
+    report = ReportService(db).get_report("report")
+    assert report.status == ReportStatus.FAILED
+    assert report.file_path is None